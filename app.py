@@ -2,13 +2,104 @@ import os
 import json
 import time
 import uuid
+import queue
+import asyncio
 import logging
-
-from flask import Flask, request, Response
-from helpers import rest_response, rest_error
+import threading
+
+import httpx
+import orjson
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask, Response, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+from batcher import MicroBatcher
+from cache import EMBEDDING_MODEL_NAME, cache_key, cache_text, create_response_cache
+from core import (
+    LOG_EXPLAINER_INSTRUCTIONS,
+    build_prompt,
+    extract_text_from_response,
+    is_confident_explanation,
+    is_routine_log,
+    load_model_json,
+    log_explainer_schema,
+    openapi_spec,
+    parse_json_from_response,
+    parse_model_explanation,
+    validate_input,
+)
+from helpers import (
+    OrjsonProvider,
+    PrecomputedBody,
+    gzip_file_response,
+    rest_error,
+    rest_response,
+    sse_event,
+)
+from ratelimit import ClientRateLimiter, TokenBucket
 from google import genai
+from google.genai import types
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Number of trusted reverse proxies in front of the app (0 = none). When set,
+# request.remote_addr (and so the per-client rate limit) comes from that many
+# X-Forwarded-For hops instead of the proxy's own address.
+_trusted_proxies = int(os.getenv("TRUSTED_PROXIES", "0"))
+if _trusted_proxies:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=_trusted_proxies)
+
+
+class ThreadPerRequest:
+    """
+    ASGI middleware that gives every HTTP request its own WSGI thread.
+
+    WsgiToAsgi runs the WSGI app with thread-sensitive sync_to_async, which
+    puts every request of a process on one shared thread. Flask hands async
+    views to asgiref's async_to_sync, which runs the coroutine on the server's
+    event loop while the WSGI thread blocks until it finishes, so on a shared
+    thread a single slow Gemini call would hold up all other requests. A
+    ThreadSensitiveContext per request gives it a dedicated thread, and a
+    semaphore caps how many run at once.
+
+    Async views therefore run on the server's loop and must not make blocking
+    calls (use asyncio.to_thread); sync views and streaming bodies run on the
+    request's own thread and may block.
+    Lifespan events, which WSGI has no equivalent for, are handled here;
+    on_startup, if given, is called once when the server starts.
+    """
+
+    def __init__(self, asgi_app, max_concurrency: int, on_startup=None):
+        self.asgi_app = asgi_app
+        self.max_concurrency = max_concurrency
+        self.on_startup = on_startup
+        self._semaphore = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            return await self.asgi_app(scope, receive, send)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            async with ThreadSensitiveContext():
+                return await self.asgi_app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.on_startup is not None:
+                    self.on_startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
 
 # ---------------------------------------------------------------------------
 # Logging configuration
@@ -27,157 +118,455 @@ if not logger.handlers:
 # Gemini client
 # ---------------------------------------------------------------------------
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# One client per process. Its async transport is an HTTP/2 httpx pool sized so
+# many in-flight Gemini calls reuse warm connections instead of paying a new
+# TCP+TLS handshake each.
+client = genai.Client(
+    api_key=os.getenv("GEMINI_API_KEY"),
+    http_options=types.HttpOptions(
+        timeout=int(os.getenv("GEMINI_TIMEOUT_MS", "60000")),
+        # Retry rate limiting (429) and transient server errors with
+        # exponential backoff and jitter.
+        retry_options=types.HttpRetryOptions(
+            attempts=4,
+            initial_delay=1.0,
+            max_delay=30.0,
+            http_status_codes=[429, 500, 502, 503, 504],
+        ),
+        async_client_args={
+            "http2": True,
+            "limits": httpx.Limits(
+                max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", "200")),
+                max_keepalive_connections=int(os.getenv("GEMINI_MAX_KEEPALIVE_CONNECTIONS", "100")),
+            ),
+        },
+    ),
+)
 MODEL_NAME = "gemini-2.5-pro"
+# Routine log lines go to the faster, cheaper model first and are escalated to
+# MODEL_NAME only if its answer is incomplete or unsure.
+FAST_MODEL_NAME = "gemini-2.5-flash"
+MODEL_ROUTING_ENABLED = os.getenv("GEMINI_MODEL_ROUTING", "1") == "1"
+
+# Under asgi_app, async views run on the server's event loop (see
+# ThreadPerRequest); under plain WSGI (flask run, the test client) each runs in
+# its own short-lived loop, and the streaming view has no loop at all. The async
+# Gemini client keeps a pooled httpx.AsyncClient whose connections are bound to
+# the loop that opened them, so all Gemini coroutines run on a single
+# long-lived loop owned by a background thread.
+_gemini_loop = None
+_gemini_loop_lock = threading.Lock()
+
+
+def get_gemini_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the shared event loop used for Gemini calls, starting it on first use.
+    """
+    global _gemini_loop
+    with _gemini_loop_lock:
+        if _gemini_loop is None:
+            _gemini_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_gemini_loop.run_forever,
+                name="gemini-loop",
+                daemon=True,
+            ).start()
+    return _gemini_loop
+
+
+async def run_on_gemini_loop(coro):
+    """
+    Schedules a coroutine on the shared Gemini loop and awaits its result
+    from the caller's loop.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_gemini_loop())
+    return await asyncio.wrap_future(future)
 
-LOG_EXPLAINER_INSTRUCTIONS = """
-You are a senior SRE helping a developer understand log entries.
-
-Given:
-- A single log line (possibly JSON or plain text)
-- Optional context metadata
-
-Goals:
-- Parse or infer: timestamp, severity, component/service, and main event
-- Explain in plain English what happened
-- Infer likely causes and recommended next troubleshooting steps
-
-Output ONLY JSON with the following schema:
-{
-  "summary": string,
-  "severity": string,
-  "component": string | null,
-  "probable_causes": string[],
-  "recommended_actions": string[],
-  "raw_log": string
-}
-Do not add any extra fields.
-If the log cannot be interpreted, state that in "summary" and keep other fields minimal.
-"""
-
-
-def build_prompt(log_entry: str, context: dict | None) -> str:
-    parts = [
-        LOG_EXPLAINER_INSTRUCTIONS.strip(),
-        "",
-        "LOG ENTRY:",
-        str(log_entry),
-    ]
-
-    if context:
-        parts.extend(
-            [
-                "",
-                "ADDITIONAL CONTEXT (JSON):",
-                json.dumps(context, indent=2),
-            ]
+
+def iter_on_gemini_loop(agen):
+    """
+    Runs an async generator on the shared Gemini loop and yields its items
+    to the calling (synchronous) thread, e.g. a streaming response body.
+    Exceptions raised by the generator are re-raised here.
+    """
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put(item)
+        finally:
+            items.put(done)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_gemini_loop())
+    try:
+        while (item := items.get()) is not done:
+            yield item
+        future.result()
+    finally:
+        # Stops the upstream stream if the client went away early.
+        future.cancel()
+
+
+# ---------------------------------------------------------------------------
+# Response cache
+# ---------------------------------------------------------------------------
+
+# Store and index calls block (Redis round trips, FAISS searches), so async
+# views run them with asyncio.to_thread rather than on the event loop.
+response_cache = create_response_cache()
+
+
+async def embed_text(text: str) -> list[float]:
+    """
+    Returns the Gemini embedding used for semantic cache lookups.
+    """
+    response = await run_on_gemini_loop(
+        client.aio.models.embed_content(
+            model=EMBEDDING_MODEL_NAME,
+            contents=text,
         )
+    )
+    return response.embeddings[0].values
+
+
+# ---------------------------------------------------------------------------
+# Generation settings
+# ---------------------------------------------------------------------------
+
+# A low temperature and a schema-constrained JSON response keep output short
+# and directly parseable. Gemini 2.5 models count thinking tokens against
+# max_output_tokens, so the cap is the thinking budget plus room for the answer.
+# Thinking is switched off for the fast model to keep its latency low.
+GENERATION_TEMPERATURE = 0.1
+THINKING_BUDGET_TOKENS = {
+    MODEL_NAME: int(os.getenv("GEMINI_THINKING_BUDGET", "1024")),
+    FAST_MODEL_NAME: 0,
+}
+ANSWER_MAX_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "512"))
+
 
-    parts.extend(
-        [
-            "",
-            "Return ONLY JSON as specified above.",
-        ]
+def build_generate_config(model: str, **instructions) -> types.GenerateContentConfig:
+    """
+    Returns the generation config for a model, with the instructions given
+    either as system_instruction or cached_content.
+    """
+    thinking_budget = THINKING_BUDGET_TOKENS[model]
+    return types.GenerateContentConfig(
+        temperature=GENERATION_TEMPERATURE,
+        max_output_tokens=thinking_budget + ANSWER_MAX_TOKENS,
+        thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
+        response_mime_type="application/json",
+        response_json_schema=log_explainer_schema,
+        **instructions,
     )
 
-    return "\n".join(parts)
 
+# Built once per model, since they do not depend on the request.
+_SYSTEM_INSTRUCTION_CONFIGS = {
+    model: build_generate_config(model, system_instruction=LOG_EXPLAINER_INSTRUCTIONS)
+    for model in THINKING_BUDGET_TOKENS
+}
+
+
+# ---------------------------------------------------------------------------
+# Gemini context cache for the system instructions
+# ---------------------------------------------------------------------------
+
+# Explicit context caching is opt-in: Gemini only accepts caches above a
+# model-specific minimum token count, which the current instructions are well
+# below. Without it the instructions are sent as a system instruction, a
+# stable prefix that Gemini 2.5 models can still cache implicitly.
+CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE", "0") == "1"
+CONTEXT_CACHE_TTL_SECONDS = 3600
+# Recreate the cache well before its TTL runs out.
+CONTEXT_CACHE_REFRESH_SECONDS = 50 * 60
+
+# Context caches are per model: model -> (cache name or None, refresh time).
+# Each model has its own lock, so recreating one cache does not hold up the other.
+_context_caches = {}
+_context_cache_locks = {}
 
-def extract_text_from_response(response) -> str:
+
+async def get_instructions_cache_name(model: str) -> str | None:
     """
-    Extracts text from the response object.
-    Uses response.text first, then candidate parts as a fallback.
+    Returns the name of the model's context cache holding
+    LOG_EXPLAINER_INSTRUCTIONS, creating or recreating it when due. Returns
+    None if caching is disabled or the cache could not be created. Must run
+    on the Gemini loop.
     """
-    if getattr(response, "text", None):
-        return response.text.strip()
+    if not CONTEXT_CACHE_ENABLED:
+        return None
+
+    lock = _context_cache_locks.setdefault(model, asyncio.Lock())
+    async with lock:
+        cache_name, refresh_at = _context_caches.get(model, (None, 0.0))
+        if time.time() >= refresh_at:
+            try:
+                cache = await client.aio.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=LOG_EXPLAINER_INSTRUCTIONS,
+                        ttl=f"{CONTEXT_CACHE_TTL_SECONDS}s",
+                    ),
+                )
+                cache_name = cache.name
+            except Exception as e:
+                cache_name = None
+                logger.warning(json.dumps({"model": model, "context_cache_error": str(e)}))
+            # On failure, fall back to the plain system instruction until the next attempt.
+            _context_caches[model] = (cache_name, time.time() + CONTEXT_CACHE_REFRESH_SECONDS)
+
+    return cache_name
+
+
+# ---------------------------------------------------------------------------
+# Gemini concurrency and rate limits
+# ---------------------------------------------------------------------------
 
-    texts = []
-    for candidate in getattr(response, "candidates", []) or []:
-        content = getattr(candidate, "content", None)
-        if not content:
-            continue
-        for part in getattr(content, "parts", []) or []:
-            part_text = getattr(part, "text", None)
-            if part_text:
-                texts.append(part_text)
+# Caps in-flight generate_content calls per process. Bound to the Gemini loop.
+_gemini_semaphore = asyncio.Semaphore(int(os.getenv("GEMINI_MAX_INFLIGHT", "50")))
 
-    return "\n".join(texts).strip()
+# Paces calls to stay under the account's requests-per-minute quota (0 = unlimited).
+_gemini_max_rpm = int(os.getenv("GEMINI_MAX_RPM", "0"))
+gemini_rate_limiter = (
+    TokenBucket(rate=_gemini_max_rpm / 60.0, capacity=max(1.0, _gemini_max_rpm / 60.0))
+    if _gemini_max_rpm
+    else None
+)
 
+# Per-client limit on /explain-log requests (0 = unlimited).
+_client_rate_limit = int(os.getenv("CLIENT_RATE_LIMIT_PER_MINUTE", "0"))
+client_rate_limiter = ClientRateLimiter(_client_rate_limit) if _client_rate_limit else None
 
-def parse_json_from_response(text: str, log_entry: str, debug_meta: dict | None = None) -> dict:
+
+async def get_generate_config(model: str) -> types.GenerateContentConfig:
     """
-    Attempts to parse a JSON object from model output.
-    Handles responses wrapped in ```json code fences.
-    If parsing fails, returns a fallback structure with the raw text in the summary.
+    Returns the model's generation config, referencing the cached
+    instructions when available. Must run on the Gemini loop.
     """
-    if not text:
-        result = {
-            "summary": "Model returned an empty response.",
-            "severity": "INFO",
-            "component": None,
-            "probable_causes": [],
-            "recommended_actions": [],
-            "raw_log": log_entry,
-        }
-        if debug_meta:
-            result["_debug"] = debug_meta
-        return result
+    cache_name = await get_instructions_cache_name(model)
+    if cache_name:
+        return build_generate_config(model, cached_content=cache_name)
+    return _SYSTEM_INSTRUCTION_CONFIGS[model]
 
-    cleaned = text.strip()
 
-    if cleaned.startswith("```"):
-        lines = cleaned.splitlines()
-        if len(lines) >= 2:
-            lines = lines[1:]
-            if lines and lines[-1].strip().startswith("```"):
-                lines = lines[:-1]
-            cleaned = "\n".join(lines).strip()
+async def generate_explanation(prompt: str, model: str = MODEL_NAME):
+    """
+    Calls Gemini for a single prompt. Must run on the Gemini loop.
+    """
+    config = await get_generate_config(model)
 
-    try:
-        obj = json.loads(cleaned)
-    except json.JSONDecodeError:
-        obj = {
-            "summary": cleaned,
-            "severity": "INFO",
-            "component": None,
-            "probable_causes": [],
-            "recommended_actions": [],
-            "raw_log": log_entry,
-        }
+    async with _gemini_semaphore:
+        if gemini_rate_limiter is not None:
+            await asyncio.sleep(gemini_rate_limiter.reserve())
+
+        return await client.aio.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=config,
+        )
+
+
+async def stream_explanation(prompt: str, model: str = MODEL_NAME):
+    """
+    Streams the text of a Gemini answer chunk by chunk, under the same
+    concurrency and rate limits as generate_explanation. Must run on the
+    Gemini loop.
+    """
+    config = await get_generate_config(model)
+
+    async with _gemini_semaphore:
+        if gemini_rate_limiter is not None:
+            await asyncio.sleep(gemini_rate_limiter.reserve())
+
+        stream = await client.aio.models.generate_content_stream(
+            model=model,
+            contents=prompt,
+            config=config,
+        )
+        async for chunk in stream:
+            text = chunk.text
+            if text:
+                yield text
+
+
+# With GEMINI_BATCH_WINDOW_MS set, requests arriving within the window are
+# coalesced and sent to Gemini concurrently. Gemini has no multi-prompt
+# endpoint, so a batch is an asyncio.gather over the shared async client and
+# its connection pool. Items are (prompt, model). Without a window, batching
+# would only add a queue hop, so calls go straight to generate_explanation.
+_batch_window_seconds = float(os.getenv("GEMINI_BATCH_WINDOW_MS", "0")) / 1000.0
+explain_batcher = (
+    MicroBatcher(
+        lambda item: generate_explanation(*item),
+        max_batch_size=int(os.getenv("GEMINI_BATCH_SIZE", "8")),
+        window_seconds=_batch_window_seconds,
+    )
+    if _batch_window_seconds > 0
+    else None
+)
+
+
+async def request_explanation(prompt: str, model: str):
+    """
+    Calls Gemini for a prompt, through explain_batcher when batching is
+    enabled. Must run on the Gemini loop.
+    """
+    if explain_batcher is None:
+        return await generate_explanation(prompt, model)
+    return await explain_batcher.submit((prompt, model))
+
+
+def parse_explain_request() -> tuple:
+    """
+    Reads log, context and context_raw from the JSON body, plus the context
+    form the cache keys on (whichever one is sent to the model).
+    """
+    body = request.get_json(silent=True) or {}
+    log_entry = body.get("log")
+    context = body.get("context")
+    context_raw = body.get("context_raw")
+    cache_context = context_raw if context_raw else context
+    return log_entry, context, context_raw, cache_context
 
-    obj.setdefault("raw_log", log_entry)
 
-    if debug_meta is not None:
-        obj.setdefault("_debug", debug_meta)
+def reject_explain_request(log_entry, context_raw) -> tuple[Response, str] | None:
+    """
+    Returns the error response and log message for a rate-limited or invalid
+    request, or None if it may proceed.
+    """
+    if client_rate_limiter is not None and not client_rate_limiter.allow(request.remote_addr):
+        return rest_error("Rate limit exceeded, retry later", status=429), "Rate limit exceeded"
+
+    if not log_entry:
+        return rest_error("Missing 'log' field in JSON body"), "Missing 'log' field"
 
-    return obj
+    input_error = validate_input(log_entry, context_raw)
+    if input_error:
+        return rest_error(input_error), input_error
+
+    return None
+
+
+def select_model(log_entry: str) -> str:
+    """
+    Returns the model to try first for a log entry.
+    """
+    if MODEL_ROUTING_ENABLED and is_routine_log(log_entry):
+        return FAST_MODEL_NAME
+    return MODEL_NAME
+
+
+def needs_escalation(model: str, raw_text: str) -> bool:
+    """
+    Returns True if a fast-model answer is incomplete or unsure and should be
+    retried on MODEL_NAME.
+    """
+    if model == MODEL_NAME:
+        return False
+    fast_result = load_model_json(raw_text)
+    return not (isinstance(fast_result, dict) and is_confident_explanation(fast_result))
+
+
+def parse_result(raw_text: str, log_entry: str, debug_meta: dict | None = None) -> tuple[dict, bool]:
+    """
+    Returns the parsed result and whether it may be cached. Fallback results
+    (empty or undecodable output) are returned but not cached.
+    """
+    parsed = parse_model_explanation(raw_text, log_entry)
+    if parsed is not None:
+        return parsed, True
+    return parse_json_from_response(raw_text, log_entry, debug_meta=debug_meta), False
+
+
+def log_request(
+    request_id: str,
+    start_time: float,
+    path: str,
+    method: str,
+    *,
+    status: str,
+    model: str | None = None,
+    escalated: bool = False,
+    cache: str = "bypass",
+    error: str | None = None,
+) -> None:
+    """
+    Writes the structured log record for one /explain-log or stream request.
+    """
+    latency_ms = (time.time() - start_time) * 1000.0
+    log_record = {
+        "request_id": request_id,
+        "path": path,
+        "method": method,
+        "status": status,
+        "model": model,
+        "escalated": escalated,
+        "cache": cache,
+        "latency_ms": round(latency_ms, 2),
+    }
+    if error:
+        log_record["error"] = error
+
+    logger.info(json.dumps(log_record))
 
 
 @app.route("/explain-log", methods=["POST"])
-def explain_log():
+async def explain_log():
     request_id = str(uuid.uuid4())
     start_time = time.time()
     status_label = "OK"
+    cache_status = "bypass"
+    model_used = None
+    escalated = False
     error_message = None
 
-    body = request.get_json(silent=True) or {}
-    log_entry = body.get("log")
-    context = body.get("context")
+    log_entry, context, context_raw, cache_context = parse_explain_request()
+    use_cache = request.args.get("nocache") != "1"
+    key = None
 
     try:
-        if not log_entry:
+        rejection = reject_explain_request(log_entry, context_raw)
+        if rejection is not None:
             status_label = "ERROR"
-            return rest_error("Missing 'log' field in JSON body")
-
-        prompt = build_prompt(log_entry, context)
-
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=prompt,
-        )
-
+            response, error_message = rejection
+            return response
+
+        embedding = None
+        if use_cache:
+            key = cache_key(log_entry, cache_context)
+            cached = await asyncio.to_thread(response_cache.get, key)
+            if cached is not None:
+                cache_status = "hit"
+                return rest_response(cached)
+
+            if response_cache.semantic is not None:
+                try:
+                    embedding = await embed_text(cache_text(log_entry, cache_context))
+                except Exception as e:
+                    logger.warning(json.dumps({"request_id": request_id, "embedding_error": str(e)}))
+                else:
+                    similar = await asyncio.to_thread(response_cache.semantic.search, embedding)
+                    if similar is not None:
+                        cache_status = "semantic_hit"
+                        return rest_response({**similar, "raw_log": log_entry})
+
+            cache_status = "miss"
+
+        prompt = build_prompt(log_entry, context, context_raw)
+        model_used = select_model(log_entry)
+
+        response = await run_on_gemini_loop(request_explanation(prompt, model_used))
         raw_text = extract_text_from_response(response)
 
+        if needs_escalation(model_used, raw_text):
+            escalated = True
+            model_used = MODEL_NAME
+            response = await run_on_gemini_loop(request_explanation(prompt, model_used))
+            raw_text = extract_text_from_response(response)
+
         debug_meta = None
         if not raw_text:
             debug_meta = {
@@ -185,154 +574,189 @@ def explain_log():
                 "prompt_feedback": getattr(response, "prompt_feedback", None),
             }
 
-        parsed = parse_json_from_response(raw_text, log_entry, debug_meta=debug_meta)
+        parsed, cacheable = parse_result(raw_text, log_entry, debug_meta=debug_meta)
+        if key is not None and cacheable:
+            await asyncio.to_thread(response_cache.set, key, parsed, embedding=embedding)
 
         return rest_response(parsed)
 
     except Exception as e:
-        status_label = "ERROR"
         error_message = str(e)
+        stale = await asyncio.to_thread(response_cache.get_stale, key) if key is not None else None
+        if stale is not None:
+            cache_status = "stale"
+            return rest_response(stale)
+
+        status_label = "ERROR"
         return rest_error(f"Gemini API error: {e}")
 
     finally:
-        latency_ms = (time.time() - start_time) * 1000.0
-        log_record = {
-            "request_id": request_id,
-            "path": request.path,
-            "method": request.method,
-            "status": status_label,
-            "model": MODEL_NAME,
-            "latency_ms": round(latency_ms, 2),
-        }
-        if error_message:
-            log_record["error"] = error_message
+        log_request(
+            request_id, start_time, request.path, request.method,
+            status=status_label, model=model_used, escalated=escalated,
+            cache=cache_status, error=error_message,
+        )
+
+
+@app.route("/explain-log/stream", methods=["POST"])
+def explain_log_stream():
+    """
+    Streams an explanation as Server-Sent Events: "chunk" events carry raw
+    model text as it is generated, "retry" means the fast model's answer was
+    discarded and the output restarts on MODEL_NAME, and a final "result" or
+    "error" event carries the standard response envelope.
+    """
+    request_id = str(uuid.uuid4())
+    start_time = time.time()
+    # The body is iterated after the request context is gone.
+    path, method = request.path, request.method
+
+    log_entry, context, context_raw, cache_context = parse_explain_request()
+    use_cache = request.args.get("nocache") != "1"
+
+    rejection = reject_explain_request(log_entry, context_raw)
+    if rejection is not None:
+        response, error_message = rejection
+        log_request(request_id, start_time, path, method, status="ERROR", error=error_message)
+        return response
+
+    def generate():
+        status_label = "OK"
+        cache_status = "bypass"
+        model_used = None
+        escalated = False
+        error_message = None
+        key = None
+
+        # The body is iterated on the request's own WSGI thread, not an event
+        # loop, so the blocking cache calls are made directly.
+        try:
+            if use_cache:
+                key = cache_key(log_entry, cache_context)
+                cached = response_cache.get(key)
+                if cached is not None:
+                    cache_status = "hit"
+                    yield sse_event("result", {"status": "OK", "result": cached})
+                    return
+                cache_status = "miss"
+
+            prompt = build_prompt(log_entry, context, context_raw)
+
+            def stream_chunks(model, texts):
+                for text in iter_on_gemini_loop(stream_explanation(prompt, model)):
+                    texts.append(text)
+                    yield sse_event("chunk", {"text": text})
+
+            model_used = select_model(log_entry)
+
+            texts = []
+            yield from stream_chunks(model_used, texts)
+            raw_text = "".join(texts).strip()
+
+            if needs_escalation(model_used, raw_text):
+                escalated = True
+                model_used = MODEL_NAME
+                yield sse_event("retry", {"model": model_used})
+                texts = []
+                yield from stream_chunks(model_used, texts)
+                raw_text = "".join(texts).strip()
+
+            parsed, cacheable = parse_result(raw_text, log_entry)
+            if key is not None and cacheable:
+                response_cache.set(key, parsed)
+
+            yield sse_event("result", {"status": "OK", "result": parsed})
+
+        except Exception as e:
+            error_message = str(e)
+            stale = response_cache.get_stale(key) if key is not None else None
+            if stale is not None:
+                cache_status = "stale"
+                yield sse_event("result", {"status": "OK", "result": stale})
+            else:
+                status_label = "ERROR"
+                yield sse_event("error", {"status": "ERROR", "result": f"Gemini API error: {e}"})
+
+        finally:
+            log_request(
+                request_id, start_time, path, method,
+                status=status_label, model=model_used, escalated=escalated,
+                cache=cache_status, error=error_message,
+            )
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# The OpenAPI document is serialized and compressed once at import time.
+_OPENAPI_BODY = PrecomputedBody(orjson.dumps(openapi_spec), "application/json")
 
-        logger.info(json.dumps(log_record))
+
+# Cache lifetime of static files. The default of 0 makes browsers revalidate
+# the UI on every load (a cheap 304), so new deployments show up immediately.
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = int(os.getenv("STATIC_MAX_AGE_SECONDS", "0"))
 
 
 @app.route("/")
 def root():
-    return app.send_static_file("index.html")
-
-
-openapi_spec = {
-    "openapi": "3.1.0",
-    "info": {
-        "title": "lucidlog-api",
-        "version": "1.0.0",
-        "description": "LLM-powered log explanation service backed by Gemini Pro."
-    },
-    "paths": {
-        "/explain-log": {
-            "post": {
-                "summary": "Explain a single log entry",
-                "operationId": "explainLog",
-                "requestBody": {
-                    "required": True,
-                    "content": {
-                        "application/json": {
-                            "schema": {
-                                "$ref": "#/components/schemas/ExplainLogRequest"
-                            }
-                        }
-                    }
-                },
-                "responses": {
-                    "200": {
-                        "description": "Successful explanation",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "$ref": "#/components/schemas/ExplainLogResponse"
-                                }
-                            }
-                        }
-                    },
-                    "400": {
-                        "description": "Invalid input or upstream error",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "$ref": "#/components/schemas/ExplainLogResponse"
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    },
-    "components": {
-        "schemas": {
-            "ExplainLogRequest": {
-                "type": "object",
-                "required": ["log"],
-                "properties": {
-                    "log": {
-                        "type": "string",
-                        "description": "Single log line to explain."
-                    },
-                    "context": {
-                        "type": "object",
-                        "description": "Optional contextual metadata (host, pod, cluster, trace ID, etc.).",
-                        "additionalProperties": True
-                    }
-                }
-            },
-            "ExplainLogResult": {
-                "type": "object",
-                "properties": {
-                    "summary": {"type": "string"},
-                    "severity": {"type": "string"},
-                    "component": {
-                        "type": ["string", "null"]
-                    },
-                    "probable_causes": {
-                        "type": "array",
-                        "items": {"type": "string"}
-                    },
-                    "recommended_actions": {
-                        "type": "array",
-                        "items": {"type": "string"}
-                    },
-                    "raw_log": {"type": "string"},
-                    "_debug": {
-                        "type": "object",
-                        "description": "Optional diagnostic information for debugging model responses.",
-                        "additionalProperties": True
-                    }
-                },
-                "required": ["summary", "severity", "component", "probable_causes", "recommended_actions", "raw_log"]
-            },
-            "ExplainLogResponse": {
-                "type": "object",
-                "properties": {
-                    "status": {
-                        "type": "string",
-                        "enum": ["OK", "ERROR"]
-                    },
-                    "result": {
-                        "oneOf": [
-                            {"$ref": "#/components/schemas/ExplainLogResult"},
-                            {"type": "string"}
-                        ]
-                    }
-                },
-                "required": ["status", "result"]
-            }
-        }
-    }
-}
+    # send_static_file reads the file per request (so UI edits show up without
+    # a restart) and answers If-None-Match / If-Modified-Since with a 304.
+    return gzip_file_response(app.send_static_file("index.html"), request)
 
 
 @app.route("/openapi.json", methods=["GET"])
 def openapi_json():
-    return Response(
-        json.dumps(openapi_spec),
-        mimetype="application/json"
-    )
+    return _OPENAPI_BODY.response(request)
+
+
+# ---------------------------------------------------------------------------
+# Startup warm-up
+# ---------------------------------------------------------------------------
+
+WARM_UP_ENABLED = os.getenv("GEMINI_WARM_UP", "1") == "1"
+
+
+async def warm_up_gemini() -> None:
+    """
+    Makes a tiny Gemini request so the first user request does not pay for
+    DNS, the TLS handshake and HTTP/2 setup, and creates the instruction
+    context caches when they are enabled. Failures are logged and ignored.
+    Must run on the Gemini loop.
+    """
+    try:
+        await client.aio.models.get(model=MODEL_NAME)
+        for model in THINKING_BUDGET_TOKENS:
+            await get_instructions_cache_name(model)
+    except Exception as e:
+        logger.warning(json.dumps({"warm_up_error": str(e)}))
+
+
+def start_warm_up():
+    """
+    Schedules warm_up_gemini on the Gemini loop without waiting for it, so
+    server startup is not delayed.
+    """
+    return asyncio.run_coroutine_threadsafe(warm_up_gemini(), get_gemini_loop())
+
+
+# ASGI entry point, e.g. `hypercorn app:asgi_app`. Each server process warms
+# its own client on startup; connections cannot be shared across processes.
+asgi_app = ThreadPerRequest(
+    WsgiToAsgi(app),
+    max_concurrency=int(os.getenv("MAX_CONCURRENT_REQUESTS", "300")),
+    on_startup=start_warm_up if WARM_UP_ENABLED else None,
+)
 
 
 if __name__ == "__main__":
-    port = int(os.getenv("PORT", "8080"))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    # Serve the ASGI app rather than the Werkzeug debug server so concurrent
+    # requests overlap their Gemini calls. Use `flask run` for hot reload.
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"0.0.0.0:{os.getenv('PORT', '8080')}"]
+    asyncio.run(serve(asgi_app, config))
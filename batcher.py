@@ -0,0 +1,76 @@
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Coalesces items submitted close together into batches and runs each batch
+    with asyncio.gather, resolving every caller's future with its own result.
+
+    A batch is dispatched once it holds max_batch_size items or window_seconds
+    have passed since its first item arrived. With a zero window, only items
+    already queued (a burst) are grouped and no latency is added.
+
+    The queue and worker task are bound to the loop of the first submit(),
+    so all callers must share that loop.
+    """
+
+    def __init__(self, handler, max_batch_size: int = 8, window_seconds: float = 0.0):
+        self._handler = handler
+        self._max_batch_size = max_batch_size
+        self._window_seconds = window_seconds
+        self._queue = None
+        self._worker = None
+        self._tasks = set()
+
+    async def submit(self, item):
+        """
+        Queues an item and waits for the handler's result for it.
+        """
+        loop = asyncio.get_running_loop()
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self._window_seconds
+
+        while len(batch) < self._max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Dispatch without awaiting so the next batch can start collecting.
+            task = asyncio.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: list):
+        results = await asyncio.gather(
+            *(self._handler(item) for item, _ in batch),
+            return_exceptions=True,
+        )
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,211 @@
+import os
+import time
+import logging
+import hashlib
+import threading
+
+import orjson
+
+from core import compact_json
+
+# ---------------------------------------------------------------------------
+# Response cache for /explain-log
+# ---------------------------------------------------------------------------
+#
+# Two tiers:
+#   1. Exact match on a SHA-256 of the log entry and its context. Stored in
+#      Redis when REDIS_URL is set, otherwise in process memory.
+#   2. Optional semantic match on Gemini embeddings, held in an in-process
+#      FAISS inner-product index (enabled with SEMANTIC_CACHE=1).
+#
+# Entries are fresh for CACHE_TTL_SECONDS. They are kept for
+# CACHE_STALE_TTL_SECONDS so a previous explanation can still be served when
+# Gemini fails.
+
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_STALE_TTL_SECONDS = int(os.getenv("CACHE_STALE_TTL_SECONDS", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+EMBEDDING_MODEL_NAME = "text-embedding-004"
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_SIMILARITY_THRESHOLD", "0.95"))
+# Bounds every Redis connect and command, so an unreachable server fails fast
+# and the cache fails open instead of hanging requests.
+REDIS_TIMEOUT_SECONDS = float(os.getenv("REDIS_TIMEOUT_SECONDS", "0.5"))
+
+logger = logging.getLogger("lucidlog")
+
+
+def cache_text(log_entry, context) -> str:
+    """
+    Returns the normalized text a log entry and its context are cached under.
+    """
+    return f"{log_entry}\0{compact_json(context, sort_keys=True)}"
+
+
+def cache_key(log_entry, context) -> str:
+    """
+    Returns the exact-match cache key for a log entry and its context.
+    """
+    digest = hashlib.sha256(cache_text(log_entry, context).encode("utf-8")).hexdigest()
+    return f"lucidlog:explain:{digest}"
+
+
+class MemoryStore:
+    """
+    In-process store used when no Redis server is configured.
+    Evicts the oldest entry once max_entries is reached.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self._entries = {}
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[dict, float] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        result, stored_at = entry
+        if time.time() - stored_at > CACHE_STALE_TTL_SECONDS:
+            return None
+        return result, stored_at
+
+    def set(self, key: str, result: dict, stored_at: float) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self._max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (result, stored_at)
+
+
+class RedisStore:
+    """
+    Redis-backed store. Each entry is a hash holding the parsed result and the
+    time it was stored, expiring after the stale TTL.
+    """
+
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(
+            url,
+            socket_connect_timeout=REDIS_TIMEOUT_SECONDS,
+            socket_timeout=REDIS_TIMEOUT_SECONDS,
+        )
+
+    def get(self, key: str) -> tuple[dict, float] | None:
+        entry = self._redis.hgetall(key)
+        if not entry:
+            return None
+        return orjson.loads(entry[b"result"]), float(entry[b"stored_at"])
+
+    def set(self, key: str, result: dict, stored_at: float) -> None:
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={"result": orjson.dumps(result), "stored_at": stored_at})
+        pipe.expire(key, CACHE_STALE_TTL_SECONDS)
+        pipe.execute()
+
+
+class SemanticIndex:
+    """
+    Keeps the embeddings of recently explained logs in a FAISS inner-product
+    index. Vectors are normalized, so inner product equals cosine similarity.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        import numpy
+        import faiss
+
+        self._np = numpy
+        self._faiss = faiss
+        self._index = None
+        self._results = []
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _vector(self, values):
+        vector = self._np.asarray([values], dtype="float32")
+        self._faiss.normalize_L2(vector)
+        return vector
+
+    def search(self, values) -> dict | None:
+        vector = self._vector(values)
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                return None
+            scores, ids = self._index.search(vector, 1)
+            score, idx = float(scores[0][0]), int(ids[0][0])
+            if idx < 0 or score < SEMANTIC_SIMILARITY_THRESHOLD:
+                return None
+            result, stored_at = self._results[idx]
+        if time.time() - stored_at > CACHE_TTL_SECONDS:
+            return None
+        return result
+
+    def add(self, values, result: dict) -> None:
+        vector = self._vector(values)
+        with self._lock:
+            if self._index is None:
+                self._index = self._faiss.IndexFlatIP(vector.shape[1])
+            if self._index.ntotal >= self._max_entries:
+                self._index.remove_ids(self._np.array([0], dtype="int64"))
+                self._results.pop(0)
+            self._index.add(vector)
+            self._results.append((result, time.time()))
+
+
+class ResponseCache:
+    """
+    Caches parsed /explain-log results by exact key, with an optional
+    semantic tier keyed on embeddings.
+
+    Fails open: store errors (e.g. Redis being unreachable) are logged and
+    treated as a miss, so requests still reach Gemini.
+    """
+
+    def __init__(self, store, semantic: SemanticIndex | None = None):
+        self.store = store
+        self.semantic = semantic
+
+    def _load(self, key: str) -> tuple[dict, float] | None:
+        try:
+            return self.store.get(key)
+        except Exception as e:
+            logger.warning(orjson.dumps({"cache_error": str(e)}).decode())
+            return None
+
+    def get(self, key: str) -> dict | None:
+        """
+        Returns the cached result if it is still fresh.
+        """
+        entry = self._load(key)
+        if entry is None:
+            return None
+        result, stored_at = entry
+        if time.time() - stored_at > CACHE_TTL_SECONDS:
+            return None
+        return result
+
+    def get_stale(self, key: str) -> dict | None:
+        """
+        Returns the last cached result regardless of freshness.
+        """
+        entry = self._load(key)
+        return entry[0] if entry else None
+
+    def set(self, key: str, result: dict, embedding=None) -> None:
+        try:
+            self.store.set(key, result, time.time())
+        except Exception as e:
+            logger.warning(orjson.dumps({"cache_error": str(e)}).decode())
+        if self.semantic is not None and embedding is not None:
+            self.semantic.add(embedding, result)
+
+
+def create_response_cache() -> ResponseCache:
+    redis_url = os.getenv("REDIS_URL")
+    store = RedisStore(redis_url) if redis_url else MemoryStore()
+    semantic = SemanticIndex() if SEMANTIC_CACHE_ENABLED else None
+    return ResponseCache(store, semantic)
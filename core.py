@@ -0,0 +1,441 @@
+import re
+import json
+
+import orjson
+import fastjsonschema
+
+# ---------------------------------------------------------------------------
+# Prompt and response handling
+# ---------------------------------------------------------------------------
+#
+# Pure functions and static specs shared by the service. Kept free of Flask
+# and Gemini client state so they can be imported and tested on their own.
+
+LOG_EXPLAINER_INSTRUCTIONS = """
+You are a senior SRE helping a developer understand log entries.
+
+Given:
+- A single log line (possibly JSON or plain text)
+- Optional context metadata
+
+Goals:
+- Parse or infer: timestamp, severity, component/service, and main event
+- Explain in plain English what happened
+- Infer likely causes and recommended next troubleshooting steps
+
+Output ONLY JSON with the following schema:
+{
+  "summary": string,
+  "severity": string,
+  "component": string | null,
+  "probable_causes": string[],
+  "recommended_actions": string[],
+  "raw_log": string
+}
+Do not add any extra fields.
+If the log cannot be interpreted, state that in "summary" and keep other fields minimal.
+"""
+
+log_explainer_schema = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "severity": {"type": "string"},
+        "component": {"type": ["string", "null"]},
+        "probable_causes": {"type": "array", "items": {"type": "string"}},
+        "recommended_actions": {"type": "array", "items": {"type": "string"}},
+        "raw_log": {"type": "string"},
+    },
+    "required": ["summary", "severity", "component", "probable_causes", "recommended_actions", "raw_log"],
+}
+
+# Compiled once into specialized Python code; raises JsonSchemaException on a mismatch.
+_validate_explanation = fastjsonschema.compile(log_explainer_schema)
+
+
+def is_valid_explanation(obj) -> bool:
+    """
+    Returns True if obj matches log_explainer_schema.
+    """
+    try:
+        _validate_explanation(obj)
+    except fastjsonschema.JsonSchemaException:
+        return False
+    return True
+
+
+def compact_json(obj, sort_keys: bool = False) -> str:
+    """
+    Serializes obj as compact JSON with orjson, falling back to the stdlib for
+    values orjson rejects but JSON allows, such as integers beyond 64 bits.
+    """
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else None).decode()
+    except orjson.JSONEncodeError:
+        return json.dumps(obj, separators=(",", ":"), sort_keys=sort_keys, ensure_ascii=False)
+
+
+def validate_input(log_entry, context_raw=None) -> str | None:
+    """
+    Returns a client-facing error message if log or context_raw has the wrong
+    type, or None if the request body is usable.
+    """
+    if not isinstance(log_entry, str):
+        return f"'log' must be a string, not {type(log_entry).__name__}"
+    if context_raw is not None and not isinstance(context_raw, str):
+        return f"'context_raw' must be a string, not {type(context_raw).__name__}"
+    return None
+
+
+# The instructions travel as a system instruction (or a context cache, below),
+# so the prompt itself only carries the variable parts. Built once at import time.
+_PROMPT_PREFIX = "LOG ENTRY:\n"
+_PROMPT_CONTEXT_HEADER = "\n\nADDITIONAL CONTEXT (JSON):\n"
+_PROMPT_SUFFIX = "\n\nReturn ONLY JSON as specified in the instructions."
+
+
+def build_prompt(log_entry: str, context: dict | None, context_raw: str | None = None) -> str:
+    """
+    Builds the prompt in a single f-string, which CPython assembles with one
+    allocation (faster here than chained + or an io.StringIO buffer).
+    context_raw, when given, is the caller's already-serialized context and is
+    spliced in verbatim instead of serializing context. Raises TypeError for
+    input validate_input rejects.
+    """
+    input_error = validate_input(log_entry, context_raw)
+    if input_error:
+        raise TypeError(input_error)
+
+    if context_raw:
+        context_json = context_raw
+    elif context:
+        # Compact output keeps the prompt (and input tokens) small.
+        context_json = compact_json(context)
+    else:
+        context_json = None
+
+    if context_json:
+        return f"{_PROMPT_PREFIX}{log_entry}{_PROMPT_CONTEXT_HEADER}{context_json}{_PROMPT_SUFFIX}"
+
+    return f"{_PROMPT_PREFIX}{log_entry}{_PROMPT_SUFFIX}"
+
+
+def extract_text_from_response(response) -> str:
+    """
+    Extracts text from the response object.
+    Uses response.text first, then candidate parts as a fallback.
+    """
+    # response.text is a computed property on SDK responses, so read it once.
+    text = getattr(response, "text", None)
+    if text:
+        return text.strip()
+
+    texts = []
+    for candidate in getattr(response, "candidates", None) or ():
+        for part in getattr(getattr(candidate, "content", None), "parts", None) or ():
+            part_text = getattr(part, "text", None)
+            if part_text:
+                texts.append(part_text)
+
+    return "\n".join(texts).strip()
+
+
+# Matches a whole response wrapped in a ``` or ```json code fence; group 1 is the body.
+_FENCE_RE = re.compile(r"\A```[^\n]*\n(.*?)(?:\n[ \t]*```[^\n]*)?\Z", re.DOTALL)
+
+
+def strip_code_fence(text: str) -> str:
+    """
+    Returns the body of a ``` or ```json fenced block, or the text unchanged.
+    """
+    match = _FENCE_RE.match(text)
+    return match.group(1).strip() if match else text
+
+
+def load_model_json(text: str):
+    """
+    Decodes JSON from model output, bare or wrapped in a code fence.
+    Returns None if the output is not valid JSON.
+    """
+    cleaned = text.strip()
+
+    try:
+        # Fast path: with a JSON response mime type the model returns bare JSON.
+        return orjson.loads(cleaned)
+    except orjson.JSONDecodeError:
+        pass
+
+    unfenced = strip_code_fence(cleaned)
+    if unfenced is cleaned:
+        return None
+    try:
+        return orjson.loads(unfenced)
+    except orjson.JSONDecodeError:
+        return None
+
+
+def parse_model_explanation(text: str, log_entry: str) -> dict | None:
+    """
+    Returns the model's explanation if text decodes to an object matching
+    log_explainer_schema, or None. Only such results are worth caching.
+    """
+    obj = load_model_json(text) if text else None
+    if isinstance(obj, dict):
+        obj.setdefault("raw_log", log_entry)
+    return obj if is_valid_explanation(obj) else None
+
+
+def parse_json_from_response(text: str, log_entry: str, debug_meta: dict | None = None) -> dict:
+    """
+    Attempts to parse a JSON object from model output.
+    Handles responses wrapped in ```json code fences.
+    If parsing fails or the object does not match log_explainer_schema,
+    returns a fallback structure with the raw text in the summary.
+    """
+    if not text:
+        result = {
+            "summary": "Model returned an empty response.",
+            "severity": "INFO",
+            "component": None,
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": log_entry,
+        }
+        if debug_meta:
+            result["_debug"] = debug_meta
+        return result
+
+    obj = parse_model_explanation(text, log_entry)
+    if obj is None:
+        obj = {
+            "summary": strip_code_fence(text.strip()),
+            "severity": "INFO",
+            "component": None,
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": log_entry,
+        }
+
+    if debug_meta is not None:
+        obj.setdefault("_debug", debug_meta)
+
+    return obj
+
+
+# ---------------------------------------------------------------------------
+# Model routing
+# ---------------------------------------------------------------------------
+
+# Short lines carrying a recognizable severity are routine enough for Flash.
+ROUTINE_LOG_MAX_LENGTH = 512
+_ROUTINE_LOG_RE = re.compile(
+    r"\b(TRACE|DEBUG|INFO|NOTICE|WARN|WARNING|ERROR|ERR|CRITICAL|FATAL|SEVERE|PANIC)\b",
+    re.IGNORECASE,
+)
+# The instructions ask the model to say so in "summary" when it cannot interpret a log.
+# Only wording about the log itself counts: a summary such as "The API could not
+# parse the request body" describes the logged event, not an unsure answer.
+_LOG_SUBJECT = r"\b(the|this)\s+log(\s+(entry|line|message))?"
+_UNINTERPRETED_RE = re.compile(
+    rf"{_LOG_SUBJECT}\s+(cannot|can't|could not|couldn't)\s+be\s+(interpreted|parsed|understood)"
+    rf"|\b(unable to|cannot|can't|could not|couldn't)\s+(interpret|parse|understand)\s+{_LOG_SUBJECT}",
+    re.IGNORECASE,
+)
+
+
+def is_routine_log(log_entry: str) -> bool:
+    """
+    Returns True for log lines simple enough to try on the fast model first.
+    """
+    return len(log_entry) < ROUTINE_LOG_MAX_LENGTH and _ROUTINE_LOG_RE.search(log_entry) is not None
+
+
+def is_confident_explanation(obj: dict) -> bool:
+    """
+    Returns True if a parsed result matches log_explainer_schema and does not
+    report the log as uninterpretable.
+    """
+    if "_debug" in obj or not is_valid_explanation(obj):
+        return False
+
+    summary = obj["summary"]
+    return bool(summary) and _UNINTERPRETED_RE.search(summary) is None
+
+
+# ---------------------------------------------------------------------------
+# OpenAPI description
+# ---------------------------------------------------------------------------
+
+openapi_spec = {
+    "openapi": "3.1.0",
+    "info": {
+        "title": "lucidlog-api",
+        "version": "1.0.0",
+        "description": "LLM-powered log explanation service backed by Gemini Pro."
+    },
+    "paths": {
+        "/explain-log": {
+            "post": {
+                "summary": "Explain a single log entry",
+                "operationId": "explainLog",
+                "requestBody": {
+                    "required": True,
+                    "content": {
+                        "application/json": {
+                            "schema": {
+                                "$ref": "#/components/schemas/ExplainLogRequest"
+                            }
+                        }
+                    }
+                },
+                "responses": {
+                    "200": {
+                        "description": "Successful explanation",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/ExplainLogResponse"
+                                }
+                            }
+                        }
+                    },
+                    "400": {
+                        "description": "Invalid input or upstream error",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/ExplainLogResponse"
+                                }
+                            }
+                        }
+                    },
+                    "429": {
+                        "description": "Client rate limit exceeded",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/ExplainLogResponse"
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        "/explain-log/stream": {
+            "post": {
+                "summary": "Explain a single log entry, streaming the model output",
+                "description": (
+                    "Server-Sent Events. 'chunk' events carry model text as it is generated "
+                    "({\"text\": string}); 'retry' means output restarts on a stronger model; "
+                    "the final 'result' or 'error' event carries an ExplainLogResponse."
+                ),
+                "operationId": "explainLogStream",
+                "requestBody": {
+                    "required": True,
+                    "content": {
+                        "application/json": {
+                            "schema": {
+                                "$ref": "#/components/schemas/ExplainLogRequest"
+                            }
+                        }
+                    }
+                },
+                "responses": {
+                    "200": {
+                        "description": "Event stream",
+                        "content": {
+                            "text/event-stream": {
+                                "schema": {"type": "string"}
+                            }
+                        }
+                    },
+                    "400": {
+                        "description": "Invalid input",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/ExplainLogResponse"
+                                }
+                            }
+                        }
+                    },
+                    "429": {
+                        "description": "Client rate limit exceeded",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/ExplainLogResponse"
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    },
+    "components": {
+        "schemas": {
+            "ExplainLogRequest": {
+                "type": "object",
+                "required": ["log"],
+                "properties": {
+                    "log": {
+                        "type": "string",
+                        "description": "Single log line to explain."
+                    },
+                    "context": {
+                        "type": "object",
+                        "description": "Optional contextual metadata (host, pod, cluster, trace ID, etc.).",
+                        "additionalProperties": True
+                    },
+                    "context_raw": {
+                        "type": "string",
+                        "description": "Optional context as an already-serialized JSON string, forwarded verbatim. Takes precedence over 'context'."
+                    }
+                }
+            },
+            "ExplainLogResult": {
+                "type": "object",
+                "properties": {
+                    "summary": {"type": "string"},
+                    "severity": {"type": "string"},
+                    "component": {
+                        "type": ["string", "null"]
+                    },
+                    "probable_causes": {
+                        "type": "array",
+                        "items": {"type": "string"}
+                    },
+                    "recommended_actions": {
+                        "type": "array",
+                        "items": {"type": "string"}
+                    },
+                    "raw_log": {"type": "string"},
+                    "_debug": {
+                        "type": "object",
+                        "description": "Optional diagnostic information for debugging model responses.",
+                        "additionalProperties": True
+                    }
+                },
+                "required": ["summary", "severity", "component", "probable_causes", "recommended_actions", "raw_log"]
+            },
+            "ExplainLogResponse": {
+                "type": "object",
+                "properties": {
+                    "status": {
+                        "type": "string",
+                        "enum": ["OK", "ERROR"]
+                    },
+                    "result": {
+                        "oneOf": [
+                            {"$ref": "#/components/schemas/ExplainLogResult"},
+                            {"type": "string"}
+                        ]
+                    }
+                },
+                "required": ["status", "result"]
+            }
+        }
+    }
+}
@@ -1,5 +1,47 @@
+import gzip
 import json
+import hashlib
+
+import orjson
 from flask import Response
+from flask.json.provider import JSONProvider
+
+
+def _json_default(obj):
+    """
+    Serializes objects orjson does not handle natively, such as SDK
+    (pydantic) models that can end up in _debug metadata.
+    """
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_json(obj) -> bytes:
+    """
+    Serializes obj to UTF-8 JSON bytes, preserving key order. Falls back to
+    the stdlib for values orjson rejects, such as integers beyond 64 bits.
+    """
+    try:
+        return orjson.dumps(obj, default=_json_default)
+    except orjson.JSONEncodeError:
+        return json.dumps(obj, default=_json_default, ensure_ascii=False).encode()
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    Flask JSON provider that encodes with orjson (as used by jsonify()).
+    orjson keeps dict insertion order, so there is no key sorting.
+
+    Request bodies are still parsed with the stdlib: orjson rounds integers
+    beyond 64 bits to floats and rejects NaN, both of which json.loads keeps.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps_json(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return json.loads(s, **kwargs)
 
 
 def rest_response(obj):
@@ -17,14 +59,15 @@ def rest_response(obj):
     }
 
     return Response(
-        json.dumps(payload, ensure_ascii=False),
+        dumps_json(payload),
         mimetype="application/json"
     )
 
 
-def rest_error(message: str):
+def rest_error(message: str, status: int = 400):
     """
     Generates a standard error response with a fixed key order.
+    Uses HTTP 400 unless another status is given (e.g. 429 when rate limited).
     Output format:
     {
         "status": "ERROR",
@@ -37,7 +80,73 @@ def rest_error(message: str):
     }
 
     return Response(
-        json.dumps(payload, ensure_ascii=False),
+        dumps_json(payload),
         mimetype="application/json",
-        status=400
+        status=status
     )
+
+
+def sse_event(event: str, data) -> str:
+    """
+    Formats one Server-Sent Events frame with a JSON data payload.
+    Output format:
+    event: <event>
+    data: <json>
+    """
+    return f"event: {event}\ndata: {dumps_json(data).decode()}\n\n"
+
+
+class PrecomputedBody:
+    """
+    A static response body prepared once at import time: raw bytes, a gzip
+    variant and a strong ETag for each, so serving it needs no serialization
+    or compression per request.
+    """
+
+    def __init__(self, data: bytes, mimetype: str, max_age: int = 3600):
+        self.data = data
+        self.gzipped = gzip.compress(data, 9)
+        self.etag = hashlib.sha1(data).hexdigest()
+        self.mimetype = mimetype
+        self.max_age = max_age
+
+    def response(self, request):
+        """
+        Returns the body (gzipped when the client accepts it), or a 304 when
+        the client's If-None-Match already holds the current ETag.
+        """
+        # Respects q-values, so "gzip;q=0" refuses gzip and "*" accepts it.
+        use_gzip = request.accept_encodings["gzip"] > 0
+
+        response = Response(
+            self.gzipped if use_gzip else self.data,
+            mimetype=self.mimetype
+        )
+        response.set_etag(f"{self.etag}-gzip" if use_gzip else self.etag)
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        if use_gzip:
+            response.content_encoding = "gzip"
+
+        return response.make_conditional(request)
+
+
+def gzip_file_response(response, request):
+    """
+    Gzips a full send_file response when the client accepts it. The gzip
+    variant carries the file's ETag as a weak validator, since If-None-Match
+    compares weakly, so both variants still revalidate to a 304.
+    """
+    response.vary.add("Accept-Encoding")
+    if response.status_code != 200 or request.accept_encodings["gzip"] <= 0:
+        return response
+
+    etag, _ = response.get_etag()
+    response.direct_passthrough = False
+    response.set_data(gzip.compress(response.get_data(), 6))
+    response.content_encoding = "gzip"
+    if etag:
+        response.set_etag(etag, weak=True)
+
+    return response
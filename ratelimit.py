@@ -0,0 +1,68 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second, holding at
+    most `capacity` tokens (the allowed burst).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a token if one is available. Returns False otherwise.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def reserve(self) -> float:
+        """
+        Takes a token, going into debt if none is available, and returns how
+        many seconds the caller must wait before using it. Callers are paced
+        in the order they reserve.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class ClientRateLimiter:
+    """
+    Per-client token buckets allowing `per_minute` requests per client key.
+    Keeps at most `max_clients` buckets, dropping the least recently used.
+    """
+
+    def __init__(self, per_minute: int, max_clients: int = 10000):
+        self.per_minute = per_minute
+        self.max_clients = max_clients
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, client_key: str) -> bool:
+        with self._lock:
+            bucket = self._buckets.pop(client_key, None)
+            if bucket is None:
+                bucket = TokenBucket(rate=self.per_minute / 60.0, capacity=self.per_minute)
+                if len(self._buckets) >= self.max_clients:
+                    self._buckets.pop(next(iter(self._buckets)))
+            self._buckets[client_key] = bucket
+        return bucket.try_acquire()
@@ -1,8 +1,14 @@
+import gzip
 import json
+import time
+import asyncio
 from types import SimpleNamespace
 from unittest import mock
 
-from app import app
+from app import MODEL_NAME, app, asgi_app, get_gemini_loop, get_generate_config, start_warm_up
+from core import LOG_EXPLAINER_INSTRUCTIONS, build_prompt, extract_text_from_response, parse_json_from_response
+from cache import MemoryStore, ResponseCache, cache_text
+from ratelimit import ClientRateLimiter
 
 
 def make_dummy_gemini_response(payload: dict) -> object:
@@ -13,7 +19,7 @@ def make_dummy_gemini_response(payload: dict) -> object:
     return SimpleNamespace(text=json.dumps(payload))
 
 
-@mock.patch("app.client.models.generate_content")
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
 def test_explain_log_happy_path_log_only(mock_generate):
     # Mock Gemini returning a valid JSON object as text.
     mock_generate.return_value = make_dummy_gemini_response(
@@ -49,7 +55,7 @@ def test_explain_log_happy_path_log_only(mock_generate):
     mock_generate.assert_called_once()
 
 
-@mock.patch("app.client.models.generate_content")
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
 def test_explain_log_happy_path_with_context(mock_generate):
     mock_generate.return_value = make_dummy_gemini_response(
         {
@@ -92,6 +98,94 @@ def test_explain_log_happy_path_with_context(mock_generate):
     assert "node-03" in contents
 
 
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_forwards_context_raw_verbatim(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response({"summary": "ok"})
+    context_raw = '{ "host" : "node-07",  "trace_id": "abc123" }'
+
+    client = app.test_client()
+    client.post(
+        "/explain-log?nocache=1",
+        json={
+            "log": "2025-11-14T03:21:15Z bad things in an unstructured log",
+            "context": {"host": "ignored-host"},
+            "context_raw": context_raw,
+        },
+    )
+
+    contents = mock_generate.call_args.kwargs["contents"]
+    assert context_raw in contents
+    assert "ignored-host" not in contents
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_uses_batcher_only_with_a_window(mock_generate):
+    import app as app_module
+    from batcher import MicroBatcher
+
+    mock_generate.return_value = make_dummy_gemini_response(ROUTINE_RESULT)
+    client = app.test_client()
+    payload = {"log": "2025-11-14T03:21:15Z INFO scheduler Job finished"}
+
+    # Default (no window): no batcher, calls go straight to Gemini.
+    assert app_module.explain_batcher is None
+    assert client.post("/explain-log?nocache=1", json=payload).status_code == 200
+
+    batcher = MicroBatcher(lambda item: app_module.generate_explanation(*item), window_seconds=0.001)
+    with mock.patch.object(batcher, "submit", wraps=batcher.submit) as submit:
+        with mock.patch("app.explain_batcher", batcher):
+            assert client.post("/explain-log?nocache=1", json=payload).status_code == 200
+
+    submit.assert_called_once()
+    assert mock_generate.call_count == 2
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_sends_instructions_as_system_instruction(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response({"summary": "ok"})
+
+    client = app.test_client()
+    client.post(
+        "/explain-log?nocache=1",
+        json={"log": "2025-11-14T03:21:15Z INFO scheduler Job finished"},
+    )
+
+    kwargs = mock_generate.call_args.kwargs
+    assert LOG_EXPLAINER_INSTRUCTIONS.strip() not in kwargs["contents"]
+    assert kwargs["config"].system_instruction == LOG_EXPLAINER_INSTRUCTIONS
+    assert kwargs["config"].response_mime_type == "application/json"
+    assert kwargs["config"].temperature == 0.1
+    assert kwargs["config"].max_output_tokens > kwargs["config"].thinking_config.thinking_budget
+
+
+@mock.patch("app.CONTEXT_CACHE_ENABLED", True)
+@mock.patch.dict("app._context_caches", clear=True)
+@mock.patch("app.client.aio.caches.create", new_callable=mock.AsyncMock)
+def test_context_cache_is_reused_refreshed_and_falls_back(mock_create):
+    import app as app_module
+
+    def run_on_gemini_loop(coro):
+        return asyncio.run_coroutine_threadsafe(coro, get_gemini_loop()).result()
+
+    mock_create.return_value = SimpleNamespace(name="cachedContents/abc")
+
+    config = run_on_gemini_loop(get_generate_config(MODEL_NAME))
+    assert config.cached_content == "cachedContents/abc"
+    assert config.system_instruction is None
+
+    # The cache is reused until its refresh time.
+    run_on_gemini_loop(get_generate_config(MODEL_NAME))
+    assert mock_create.call_count == 1
+
+    # Once due, it is recreated; a failure falls back to the system instruction.
+    app_module._context_caches[MODEL_NAME] = ("cachedContents/abc", 0.0)
+    mock_create.side_effect = RuntimeError("content too small")
+    config = run_on_gemini_loop(get_generate_config(MODEL_NAME))
+    assert mock_create.call_count == 2
+    assert config.cached_content is None
+    assert config.system_instruction == LOG_EXPLAINER_INSTRUCTIONS
+
+
 def test_explain_log_invalid_payload_missing_log():
     client = app.test_client()
     resp = client.post("/explain-log", json={"foo": "bar"})
@@ -105,17 +199,58 @@ def test_explain_log_invalid_payload_missing_log():
 
 def test_explain_log_invalid_payload_wrong_type():
     client = app.test_client()
-    # log is not a string; build_prompt will fail when concatenating.
     resp = client.post("/explain-log", json={"log": 123})
 
     assert resp.status_code == 400
     data = resp.get_json()
     assert data["status"] == "ERROR"
-    # Message is generic "Gemini API error: ..." with TypeError inside.
-    assert "Gemini API error" in data["result"]
+    assert data["result"] == "'log' must be a string, not int"
+
 
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_wrong_type_is_rejected_before_cache_lookup(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response(
+        {
+            "summary": "String log.",
+            "severity": "INFO",
+            "component": "x",
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": "123",
+        }
+    )
+
+    client = app.test_client()
+    assert client.post("/explain-log", json={"log": "123"}).status_code == 200
 
-@mock.patch("app.client.models.generate_content")
+    resp = client.post("/explain-log", json={"log": 123})
+    assert resp.status_code == 400
+    mock_generate.assert_called_once()
+
+
+def test_explain_log_stream_rejects_non_string_context_raw_before_streaming():
+    client = app.test_client()
+    resp = client.post("/explain-log/stream", json={"log": "ERROR x", "context_raw": 5})
+
+    assert resp.status_code == 400
+    assert resp.mimetype == "application/json"
+    assert resp.get_json()["result"] == "'context_raw' must be a string, not int"
+
+
+def test_stream_rejections_are_logged_like_explain_log(caplog):
+    client = app.test_client()
+    with caplog.at_level("INFO", logger="lucidlog"):
+        client.post("/explain-log/stream", json={"foo": "bar"})
+        client.post("/explain-log", json={"foo": "bar"})
+
+    records = [json.loads(r.getMessage()) for r in caplog.records]
+    assert [r["path"] for r in records] == ["/explain-log/stream", "/explain-log"]
+    for record in records:
+        assert record["status"] == "ERROR"
+        assert record["error"] == "Missing 'log' field"
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
 def test_explain_log_upstream_failure(mock_generate):
     # Simulate upstream failure (timeout, network error, etc.).
     mock_generate.side_effect = TimeoutError("Upstream timeout")
@@ -131,3 +266,605 @@ def test_explain_log_upstream_failure(mock_generate):
     assert data["status"] == "ERROR"
     assert "Gemini API error" in data["result"]
     assert "Upstream timeout" in data["result"]
+
+
+@mock.patch("app.response_cache", ResponseCache(MemoryStore()))
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_cache_hit_skips_gemini(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response(
+        {
+            "summary": "Cached summary.",
+            "severity": "ERROR",
+            "component": "auth-service",
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": "cached-log-line",
+        }
+    )
+
+    client = app.test_client()
+    payload = {"log": "2025-11-14T03:21:15Z ERROR auth-service Failed login"}
+    first = client.post("/explain-log", json=payload)
+    second = client.post("/explain-log", json=payload)
+
+    assert first.get_json() == second.get_json()
+    assert second.get_json()["result"]["summary"] == "Cached summary."
+    mock_generate.assert_called_once()
+
+    # ?nocache=1 always goes to Gemini.
+    client.post("/explain-log?nocache=1", json=payload)
+    assert mock_generate.call_count == 2
+
+
+@mock.patch("app.response_cache", ResponseCache(MemoryStore()))
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_stale_fallback_on_upstream_failure(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response(
+        {
+            "summary": "Previously cached summary.",
+            "severity": "WARN",
+            "component": "gateway",
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": "stale-log-line",
+        }
+    )
+
+    client = app.test_client()
+    payload = {"log": "2025-11-14T03:21:15Z WARN gateway Upstream 503"}
+    client.post("/explain-log", json=payload)
+
+    # Expire the fresh entry, then make Gemini fail.
+    mock_generate.side_effect = TimeoutError("Upstream timeout")
+    with mock.patch("cache.CACHE_TTL_SECONDS", -1):
+        resp = client.post("/explain-log", json=payload)
+
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["status"] == "OK"
+    assert data["result"]["summary"] == "Previously cached summary."
+    assert mock_generate.call_count == 2
+
+
+class FailingStore:
+    """
+    Store whose backend is unreachable, like RedisStore with Redis down.
+    """
+
+    def get(self, key):
+        raise ConnectionError("Redis unavailable")
+
+    def set(self, key, result, stored_at):
+        raise ConnectionError("Redis unavailable")
+
+
+@mock.patch("app.response_cache", ResponseCache(FailingStore()))
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_cache_backend_failure_fails_open(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response(
+        {
+            "summary": "Served without cache.",
+            "severity": "ERROR",
+            "component": "auth-service",
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": "log-line",
+        }
+    )
+
+    client = app.test_client()
+    payload = {"log": "2025-11-14T03:21:15Z ERROR auth-service Failed login"}
+    resp = client.post("/explain-log", json=payload)
+
+    assert resp.status_code == 200
+    assert resp.get_json()["result"]["summary"] == "Served without cache."
+    mock_generate.assert_called_once()
+
+    # Gemini failing as well still yields the JSON error envelope.
+    mock_generate.side_effect = TimeoutError("Upstream timeout")
+    resp = client.post("/explain-log", json=payload)
+
+    assert resp.status_code == 400
+    assert resp.get_json()["status"] == "ERROR"
+
+
+class LoopCheckingStore(MemoryStore):
+    """
+    MemoryStore that records whether each call ran on an event loop thread.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.on_loop = []
+
+    def _record(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.on_loop.append(False)
+        else:
+            self.on_loop.append(True)
+
+    def get(self, key):
+        self._record()
+        return super().get(key)
+
+    def set(self, key, result, stored_at):
+        self._record()
+        super().set(key, result, stored_at)
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_runs_cache_store_off_the_event_loop(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response(
+        {
+            "summary": "Off loop.",
+            "severity": "ERROR",
+            "component": "x",
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": "x",
+        }
+    )
+    store = LoopCheckingStore()
+
+    with mock.patch("app.response_cache", ResponseCache(store)):
+        client = app.test_client()
+        client.post("/explain-log", json={"log": "ERROR x off-loop"})
+        client.post("/explain-log", json={"log": "ERROR x off-loop"})
+
+    # get + set on the miss, get on the hit; none of them on the loop.
+    assert store.on_loop == [False, False, False]
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_does_not_cache_fallback_results(mock_generate):
+    mock_generate.return_value = SimpleNamespace(text="not json at all")
+
+    with mock.patch("app.response_cache", ResponseCache(MemoryStore())):
+        client = app.test_client()
+        payload = {"log": "2025-11-14T03:21:15Z ERROR worker Something odd"}
+        first = client.post("/explain-log", json=payload)
+        client.post("/explain-log", json=payload)
+
+    assert first.get_json()["result"]["summary"] == "not json at all"
+    # Both requests went to Gemini (and Pro after Flash): nothing was cached.
+    assert mock_generate.call_count == 4
+
+
+@mock.patch("app.embed_text", new_callable=mock.AsyncMock, return_value=[0.1, 0.2, 0.3])
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_semantic_tier(mock_generate, mock_embed):
+    mock_generate.return_value = make_dummy_gemini_response(
+        {
+            "summary": "Fresh answer.",
+            "severity": "ERROR",
+            "component": "db",
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": "x",
+        }
+    )
+    semantic = mock.Mock()
+    semantic.search.return_value = None
+
+    with mock.patch("app.response_cache", ResponseCache(MemoryStore(), semantic=semantic)):
+        client = app.test_client()
+
+        # A miss goes to Gemini and stores the result with its embedding.
+        miss = client.post("/explain-log", json={"log": "ERROR db connection reset by peer 1"})
+        assert miss.get_json()["result"]["summary"] == "Fresh answer."
+        semantic.add.assert_called_once_with([0.1, 0.2, 0.3], miss.get_json()["result"])
+
+        # A similar line is answered from the index, with its own raw_log.
+        semantic.search.return_value = {"summary": "Similar answer.", "raw_log": "other"}
+        hit = client.post("/explain-log", json={"log": "ERROR db connection reset by peer 2"})
+
+    assert hit.get_json()["result"] == {
+        "summary": "Similar answer.",
+        "raw_log": "ERROR db connection reset by peer 2",
+    }
+    assert mock_generate.call_count == 1
+    semantic.search.assert_called_with([0.1, 0.2, 0.3])
+
+
+@mock.patch("app.client_rate_limiter", ClientRateLimiter(per_minute=1))
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_rate_limited_per_client(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response(
+        {
+            "summary": "Request served.",
+            "severity": "INFO",
+            "component": "api",
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": "rate-limited-log-line",
+        }
+    )
+
+    client = app.test_client()
+    payload = {"log": "2025-11-14T03:21:15Z INFO api Request served"}
+    first = client.post("/explain-log?nocache=1", json=payload)
+    second = client.post("/explain-log?nocache=1", json=payload)
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    data = second.get_json()
+    assert data["status"] == "ERROR"
+    assert "Rate limit exceeded" in data["result"]
+    mock_generate.assert_called_once()
+
+
+def test_extract_text_from_response_falls_back_to_candidate_parts():
+    response = SimpleNamespace(
+        text=None,
+        candidates=[
+            SimpleNamespace(content=None),
+            SimpleNamespace(
+                content=SimpleNamespace(
+                    parts=[
+                        SimpleNamespace(text='{"summary":'),
+                        SimpleNamespace(text=None),
+                        SimpleNamespace(text='"From parts."} '),
+                    ]
+                )
+            ),
+        ],
+    )
+
+    assert extract_text_from_response(response) == '{"summary":\n"From parts."}'
+    assert extract_text_from_response(SimpleNamespace(text=" bare ")) == "bare"
+    assert extract_text_from_response(SimpleNamespace()) == ""
+
+
+ROUTINE_RESULT = {
+    "summary": "A scheduled job completed.",
+    "severity": "INFO",
+    "component": "scheduler",
+    "probable_causes": [],
+    "recommended_actions": [],
+    "raw_log": "routine-log-line",
+}
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_routes_routine_logs_to_fast_model(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response(ROUTINE_RESULT)
+
+    client = app.test_client()
+    resp = client.post(
+        "/explain-log?nocache=1",
+        json={"log": "2025-11-14T03:21:15Z INFO scheduler Job finished"},
+    )
+
+    assert resp.get_json()["result"]["summary"] == "A scheduled job completed."
+    mock_generate.assert_called_once()
+    assert mock_generate.call_args.kwargs["model"] == "gemini-2.5-flash"
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_escalates_unsure_fast_answer_to_pro(mock_generate):
+    mock_generate.side_effect = [
+        make_dummy_gemini_response({**ROUTINE_RESULT, "summary": "The log cannot be interpreted."}),
+        make_dummy_gemini_response({**ROUTINE_RESULT, "summary": "Pro summary."}),
+    ]
+
+    client = app.test_client()
+    resp = client.post(
+        "/explain-log?nocache=1",
+        json={"log": "2025-11-14T03:21:15Z ERROR kernel 0x7f3a segv in ???"},
+    )
+
+    assert resp.get_json()["result"]["summary"] == "Pro summary."
+    models = [call.kwargs["model"] for call in mock_generate.call_args_list]
+    assert models == ["gemini-2.5-flash", "gemini-2.5-pro"]
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_keeps_fast_answer_about_a_parse_failure(mock_generate):
+    # The summary describes the logged event, not the model failing to read it.
+    mock_generate.return_value = make_dummy_gemini_response(
+        {**ROUTINE_RESULT, "summary": "The loader could not parse config.yaml at startup."}
+    )
+
+    client = app.test_client()
+    resp = client.post(
+        "/explain-log?nocache=1",
+        json={"log": "2025-11-14T03:21:15Z ERROR loader could not parse config.yaml"},
+    )
+
+    assert resp.get_json()["result"]["summary"] == "The loader could not parse config.yaml at startup."
+    models = [call.kwargs["model"] for call in mock_generate.call_args_list]
+    assert models == ["gemini-2.5-flash"]
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_sends_unstructured_logs_to_pro(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response(ROUTINE_RESULT)
+
+    client = app.test_client()
+    client.post("/explain-log?nocache=1", json={"log": "something odd happened " * 40})
+
+    mock_generate.assert_called_once()
+    assert mock_generate.call_args.kwargs["model"] == "gemini-2.5-pro"
+
+
+def make_dummy_gemini_stream(payload: dict, chunk_size: int = 16):
+    """
+    Returns an async iterator yielding the JSON payload in text chunks,
+    like the awaited result of generate_content_stream.
+    """
+    text = json.dumps(payload)
+
+    async def chunks():
+        for i in range(0, len(text), chunk_size):
+            yield SimpleNamespace(text=text[i:i + chunk_size])
+
+    return chunks()
+
+
+def parse_sse(data: bytes) -> list[tuple[str, dict]]:
+    events = []
+    for frame in data.decode().strip().split("\n\n"):
+        event_line, data_line = frame.split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+@mock.patch("app.client.aio.models.generate_content_stream", new_callable=mock.AsyncMock)
+def test_explain_log_stream_sends_chunks_then_result(mock_stream):
+    mock_stream.return_value = make_dummy_gemini_stream(ROUTINE_RESULT)
+
+    client = app.test_client()
+    resp = client.post(
+        "/explain-log/stream?nocache=1",
+        json={"log": "2025-11-14T03:21:15Z INFO scheduler Job finished"},
+    )
+
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+
+    events = parse_sse(resp.data)
+    chunks = [data["text"] for name, data in events if name == "chunk"]
+    assert len(chunks) > 1
+    assert json.loads("".join(chunks)) == ROUTINE_RESULT
+
+    name, data = events[-1]
+    assert name == "result"
+    assert data == {"status": "OK", "result": ROUTINE_RESULT}
+
+
+@mock.patch("app.client.aio.models.generate_content_stream", new_callable=mock.AsyncMock)
+def test_explain_log_stream_reports_upstream_failure(mock_stream):
+    mock_stream.side_effect = TimeoutError("Upstream timeout")
+
+    client = app.test_client()
+    resp = client.post(
+        "/explain-log/stream?nocache=1",
+        json={"log": "2025-11-14T01:00:00Z ERROR service Something bad"},
+    )
+
+    name, data = parse_sse(resp.data)[-1]
+    assert name == "error"
+    assert data["status"] == "ERROR"
+    assert "Upstream timeout" in data["result"]
+
+
+@mock.patch("app.client.aio.models.get", new_callable=mock.AsyncMock)
+def test_warm_up_touches_gemini_and_swallows_errors(mock_get):
+    start_warm_up().result(timeout=5)
+    mock_get.assert_called_once()
+
+    mock_get.side_effect = ConnectionError("no network")
+    # Warm-up failures must never break startup.
+    start_warm_up().result(timeout=5)
+
+
+def test_asgi_lifespan_startup_triggers_warm_up():
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    with mock.patch.object(asgi_app, "on_startup") as mock_startup:
+        asyncio.run(asgi_app({"type": "lifespan"}, receive, send))
+
+    mock_startup.assert_called_once()
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+
+
+def test_parse_json_from_response_strips_code_fences():
+    payload = {**ROUTINE_RESULT, "summary": "Fenced."}
+
+    for text in (
+        "```json\n" + json.dumps(payload) + "\n```",
+        "```\n" + json.dumps(payload, indent=2) + "\n```\n",
+        "```json\n" + json.dumps(payload),
+    ):
+        assert parse_json_from_response(text, "log-line") == payload
+
+    fallback = parse_json_from_response("```json\nnot json\n```", "log-line")
+    assert fallback["summary"] == "not json"
+    assert fallback["raw_log"] == "log-line"
+
+
+def test_openapi_json_conditional_and_gzip():
+    client = app.test_client()
+    resp = client.get("/openapi.json")
+
+    assert resp.status_code == 200
+    assert resp.get_json()["info"]["title"] == "lucidlog-api"
+    assert resp.headers["Cache-Control"] == "public, max-age=3600"
+
+    # A matching If-None-Match turns into a bodiless 304.
+    cached = client.get("/openapi.json", headers={"If-None-Match": resp.headers["ETag"]})
+    assert cached.status_code == 304
+    assert cached.data == b""
+
+    gz = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert gz.headers["ETag"] != resp.headers["ETag"]
+    assert json.loads(gzip.decompress(gz.data)) == resp.get_json()
+
+    refused = client.get("/openapi.json", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in refused.headers
+    assert refused.get_json() == resp.get_json()
+
+
+def test_root_serves_index_html_with_etag():
+    client = app.test_client()
+    resp = client.get("/")
+
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/html"
+    assert b"<html" in resp.data.lower()
+
+    cached = client.get("/", headers={"If-None-Match": resp.headers["ETag"]})
+    assert cached.status_code == 304
+    assert "max-age=0" in resp.headers["Cache-Control"]
+
+    gz = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(gz.data) == resp.data
+    assert gz.headers["ETag"] == f"W/{resp.headers['ETag']}"
+
+    gz_cached = client.get(
+        "/",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": gz.headers["ETag"]},
+    )
+    assert gz_cached.status_code == 304
+
+    refused = client.get("/", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in refused.headers
+
+
+async def post_asgi(path: str, payload: dict, query_string: bytes = b"") -> int:
+    """
+    Sends one POST request through the ASGI entry point and returns its status.
+    """
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string,
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 12345),
+        "server": ("127.0.0.1", 8080),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    return sent[0]["status"]
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_asgi_app_serves_requests_concurrently(mock_generate):
+    async def slow_generate(**kwargs):
+        await asyncio.sleep(0.5)
+        return make_dummy_gemini_response({"summary": "Slow summary."})
+
+    mock_generate.side_effect = slow_generate
+
+    async def run():
+        return await asyncio.gather(
+            *(
+                post_asgi("/explain-log", {"log": f"line {i}"}, query_string=b"nocache=1")
+                for i in range(4)
+            )
+        )
+
+    start = time.time()
+    statuses = asyncio.run(run())
+    elapsed = time.time() - start
+
+    assert statuses == [200, 200, 200, 200]
+    # Four 0.5s upstream calls overlap instead of running back to back.
+    assert elapsed < 1.5
+
+
+def test_parse_json_from_response_rejects_schema_mismatch():
+    # Valid JSON with a wrongly typed field falls back instead of propagating.
+    text = json.dumps({**ROUTINE_RESULT, "probable_causes": "not a list"})
+    result = parse_json_from_response(text, "log-line")
+
+    assert result["summary"] == text
+    assert result["probable_causes"] == []
+
+    # A missing raw_log is filled in before validation.
+    without_raw_log = {key: value for key, value in ROUTINE_RESULT.items() if key != "raw_log"}
+    result = parse_json_from_response(json.dumps(without_raw_log), "log-line")
+    assert result == {**without_raw_log, "raw_log": "log-line"}
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_serializes_sdk_debug_metadata_and_utf8(mock_generate):
+    from google.genai import types
+
+    mock_generate.return_value = SimpleNamespace(
+        text="",
+        candidates=[],
+        prompt_feedback=types.GenerateContentResponsePromptFeedback(block_reason="SAFETY"),
+    )
+
+    client = app.test_client()
+    resp = client.post("/explain-log?nocache=1", json={"log": "ERROR überprüfung fehlgeschlagen"})
+
+    assert resp.status_code == 200
+    assert "überprüfung".encode() in resp.data
+    data = resp.get_json()
+    assert data["result"]["_debug"]["prompt_feedback"] == {"block_reason": "SAFETY"}
+
+
+def test_build_prompt_and_cache_text_accept_integers_beyond_64_bits():
+    context = {"trace": 123456789012345678901234567890, "host": "node-03"}
+
+    prompt = build_prompt("ERROR x", context)
+    assert '{"trace":123456789012345678901234567890,"host":"node-03"}' in prompt
+
+    text = cache_text("ERROR x", context)
+    assert text.endswith('{"host":"node-03","trace":123456789012345678901234567890}')
+
+
+@mock.patch("app.client.aio.models.generate_content", new_callable=mock.AsyncMock)
+def test_explain_log_keeps_big_integers_from_request_body(mock_generate):
+    mock_generate.return_value = make_dummy_gemini_response(
+        {
+            "summary": "Trace explained.",
+            "severity": "ERROR",
+            "component": "x",
+            "probable_causes": [],
+            "recommended_actions": [],
+            "raw_log": "ERROR x",
+        }
+    )
+
+    client = app.test_client()
+    resp = client.post(
+        "/explain-log?nocache=1",
+        data='{"log":"ERROR x","context":{"trace":123456789012345678901234567890}}',
+        content_type="application/json",
+    )
+
+    assert resp.status_code == 200
+    prompt = mock_generate.call_args.kwargs["contents"]
+    assert '{"trace":123456789012345678901234567890}' in prompt
@@ -0,0 +1,50 @@
+import asyncio
+
+from batcher import MicroBatcher
+
+
+def test_micro_batcher_groups_concurrent_items():
+    batches = []
+
+    async def handler(item):
+        await asyncio.sleep(0.01)
+        return item * 2
+
+    async def run():
+        batcher = MicroBatcher(handler, max_batch_size=3, window_seconds=0.05)
+        dispatch = batcher._dispatch
+
+        async def recording_dispatch(batch):
+            batches.append([item for item, _ in batch])
+            await dispatch(batch)
+
+        batcher._dispatch = recording_dispatch
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    results = asyncio.run(run())
+
+    # Each caller gets its own result, in order.
+    assert results == [0, 2, 4, 6, 8]
+    # Items are grouped in arrival order into batches of at most max_batch_size.
+    # Batches are dispatched without waiting for earlier ones, so they may overlap.
+    assert batches == [[0, 1, 2], [3, 4]]
+
+
+def test_micro_batcher_propagates_handler_errors():
+    async def handler(item):
+        if item == "bad":
+            raise TimeoutError("Upstream timeout")
+        return item
+
+    async def run():
+        batcher = MicroBatcher(handler)
+        return await asyncio.gather(
+            batcher.submit("good"),
+            batcher.submit("bad"),
+            return_exceptions=True,
+        )
+
+    good, bad = asyncio.run(run())
+
+    assert good == "good"
+    assert isinstance(bad, TimeoutError)
@@ -0,0 +1,88 @@
+from unittest import mock
+
+import pytest
+
+import cache
+from cache import RedisStore, ResponseCache
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the redis-py calls RedisStore makes.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.expiry = {}
+
+    def hgetall(self, key):
+        return self.hashes.get(key, {})
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._ops = []
+
+    def hset(self, key, mapping):
+        self._ops.append(lambda: self._redis.hashes.__setitem__(
+            key, {k.encode(): v if isinstance(v, bytes) else str(v).encode() for k, v in mapping.items()}
+        ))
+
+    def expire(self, key, seconds):
+        self._ops.append(lambda: self._redis.expiry.__setitem__(key, seconds))
+
+    def execute(self):
+        for op in self._ops:
+            op()
+
+
+def test_redis_store_round_trips_results_with_timeouts():
+    redis = pytest.importorskip("redis")
+    fake = FakeRedis()
+
+    with mock.patch.object(redis.Redis, "from_url", return_value=fake) as from_url:
+        store = RedisStore("redis://cache:6379/0")
+
+    from_url.assert_called_once_with(
+        "redis://cache:6379/0",
+        socket_connect_timeout=cache.REDIS_TIMEOUT_SECONDS,
+        socket_timeout=cache.REDIS_TIMEOUT_SECONDS,
+    )
+
+    assert store.get("k") is None
+    store.set("k", {"summary": "Stored.", "trace": 12}, 1700000000.5)
+
+    assert store.get("k") == ({"summary": "Stored.", "trace": 12}, 1700000000.5)
+    assert fake.expiry["k"] == cache.CACHE_STALE_TTL_SECONDS
+
+
+def test_semantic_index_matches_similar_embeddings_only():
+    pytest.importorskip("faiss")
+    index = cache.SemanticIndex(max_entries=2)
+
+    assert index.search([1.0, 0.0, 0.0]) is None
+
+    index.add([1.0, 0.0, 0.0], {"summary": "first"})
+    assert index.search([0.99, 0.01, 0.0]) == {"summary": "first"}
+    assert index.search([0.0, 1.0, 0.0]) is None
+
+    # The oldest entry is evicted once max_entries is reached.
+    index.add([0.0, 1.0, 0.0], {"summary": "second"})
+    index.add([0.0, 0.0, 1.0], {"summary": "third"})
+    assert index.search([1.0, 0.0, 0.0]) is None
+    assert index.search([0.0, 0.0, 1.0]) == {"summary": "third"}
+
+
+def test_response_cache_adds_embeddings_to_semantic_tier():
+    semantic = mock.Mock()
+    response_cache = ResponseCache(cache.MemoryStore(), semantic=semantic)
+
+    response_cache.set("k", {"summary": "x"})
+    semantic.add.assert_not_called()
+
+    response_cache.set("k", {"summary": "x"}, embedding=[0.1, 0.2])
+    semantic.add.assert_called_once_with([0.1, 0.2], {"summary": "x"})
@@ -0,0 +1,28 @@
+from ratelimit import ClientRateLimiter, TokenBucket
+
+
+def test_token_bucket_allows_burst_then_rejects():
+    bucket = TokenBucket(rate=0.001, capacity=2)
+
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_token_bucket_reserve_paces_callers():
+    bucket = TokenBucket(rate=10.0, capacity=1)
+
+    assert bucket.reserve() == 0.0
+    # Each further reservation waits roughly one more refill interval (0.1s).
+    second = bucket.reserve()
+    third = bucket.reserve()
+    assert 0.05 < second <= 0.1
+    assert 0.15 < third <= 0.2
+
+
+def test_client_rate_limiter_is_per_client():
+    limiter = ClientRateLimiter(per_minute=1)
+
+    assert limiter.allow("10.0.0.1")
+    assert not limiter.allow("10.0.0.1")
+    assert limiter.allow("10.0.0.2")